@@ -0,0 +1,4 @@
+'''
+Email automation: form emails to a list of addressees, with reply checking and reminders.
+See automail/cli.py for usage; run as python -m automail -backend gmail|outlook|mail ...
+'''
@@ -0,0 +1,43 @@
+'''
+Running AppleScript via osascript, shared by the Outlook and Mac Mail backends.
+'''
+
+import datetime
+from . import core
+
+def run_applescript_file(script_path):
+   import subprocess
+   try: subprocess.run(['osascript', script_path], check=True)
+   except subprocess.CalledProcessError as e: print(f"AppleScript Error: {e}")
+
+def run_applescript_str(script):
+   if core.debug:
+      print('script:\n',script)
+      return ''
+   import subprocess
+   process = subprocess.Popen(['osascript', '-'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+   stdout, stderr = process.communicate(script)
+   #print('osascript output:\n',stdout)
+   if process.returncode == 0: return stdout.strip()
+   else: raise Exception(f"AppleScript Error: {stderr}")
+
+def applescript_date(var,sent):
+   # statements setting var to a log time; built from parts, as date "..." depends on locale
+   if sent=='': tt=datetime.datetime(1970,1,1) # no bound
+   else: tt=datetime.datetime.strptime(sent.split(',')[0],'%m/%d/%y %H:%M')
+   return f'''set {var} to current date
+    set day of {var} to 1
+    set year of {var} to {tt.year}
+    set month of {var} to {tt.month}
+    set day of {var} to {tt.day}
+    set time of {var} to {tt.hour*3600+tt.minute*60}'''
+
+def getreply(script):
+   # runs a reply-finding script, printing error lines and returning the rest as one reply
+   reply=run_applescript_str(script)
+   reply1=''
+   for line in reply.splitlines():
+      if line.startswith('Error processing'): print(line)
+      else: reply1+=line+'\n'
+   if reply1=='': return []
+   return [(core.replykey(text=reply1),reply1)]
@@ -0,0 +1,138 @@
+'''
+Manage form emails through a mail backend: gmail (SMTP and IMAP), outlook (MS Outlook on Mac OSX)
+or mail (Mac Mail), the latter two controlled using AppleScript.
+- Sends emails to a list of addressees, filling out a template message
+  with addressee-specific material.
+  Addressees are defined in an XML file.
+  Addressee-specific parameters are attributes under each entry.
+  Attribute names are referred to in the template as an uppercase keyword with a leading $,
+  e.g. $FIRSTNAME for attribute "firstname".
+  Sent messages are logged to another XML file, partitioned by campaign (see below).
+- Checks for replies, logging the reply date and moving the reply to a chosen folder.
+  Replies are also kept in a local store of compressed files, named by a hash of their Message-ID
+  (or of their content) and listed in the log entry, so they are only downloaded once.
+- Send a reminder for any message with no reply logged, using a reminder template.
+
+Multiple files may be specified for the addressees and the email template.
+The lists and template contents are concatenated.
+
+The email template must have:
+- A line starting with 'To: ' followed by the attribute name for the email address.
+- A line starting with 'Subject: ' followed by the subject, which can contain addressee-specific keywords.
+- Optionally, lines starting with 'Attach: ' followed by the name of a file to attach (which can contain keywords).
+  Files are passed to Outlook and Mail by path; for gmail, each file is read and encoded once per run.
+  If any file is missing, nothing is sent (checked in -debug runs too).
+- 'Body:' on a line by itself, followed by the body of the email (containing keywords) on subsequent lines.
+
+Additional text files can be inserted in the body of the email template.
+If a line starts with '++', the rest of the line is interpreted as a filename
+e.g. "++signature.txt".
+Substitution is recursive: inserted files are processed for '++' commands too.
+The script checks for insertion *after* replacing keyword fields,
+so any filenames in the template may themselves be set to addressee-specific values by using keywords.
+
+Arguments:
+   -backend/-b gmail|outlook|mail (first argument; set by the gmail.py, outlookmac.py and macmail.py scripts)
+   -template/-t TEMPLATE_FILE (needed for send and remind only)
+   -addressees/-a XML_FILE (needed for send only)
+   -folder/-f MAIL_FOLDER (default: automail)
+   -log/-l LOGFILE (default: log.xml)
+   -send/-s
+   -check/-c (checks for replies)
+   -recheck (checks even if a reply has already been received; replies already stored are shown from the store)
+   -replies (shows stored replies for all logged messages)
+   -store DIRECTORY (reply store, default: replies)
+   -remind/-r
+   -campaign NAME (campaign for messages sent, default: from first template and addressee file names)
+   -archive (compresses log partitions of campaigns where all messages have replies)
+   -close CAMPAIGN (compresses log partition of the campaign)
+      (partitions with messages sent or reminded today are kept, as they count against relay quotas;
+       archiving a reopened campaign again merges it into its archive)
+   -debug/-d (Prints send or remind messages but doesn't send or log. Specify *before* -send/-remind argument.)
+   -html/-h (format email body as HTML, which seems necessary to preserve line breaks with Outlook;
+             gmail sends it as an alternative to the plain text)
+ gmail:
+   -username/-u GMAIL_USER
+   -account GMAIL_ACCOUNT
+   -password/-p GMAIL_PASSWORD
+   -passvar GMAIL_PASSWORD_ENVIRONMENT_VARIABLE
+   -watch/-w (keeps running, checking for replies as they arrive, using IMAP IDLE)
+   -connections N (check replies over N IMAP connections at once; default: 1)
+   -maxreply CHARACTERS (longer replies are truncated, with a marker; default: 1000000)
+   -bcc MAX_RECIPIENTS (send identical messages as one, with up to this many Bcc recipients; default: 1)
+   -relays XML_FILE (pool of accounts/relays to share sending, see automail/gmail.py)
+   -imaphost HOST[:PORT] (default: imap.gmail.com; ports other than 993 are unencrypted, e.g. local test server)
+ outlook, mail:
+   -script APPLESCRIPT_FILE (runs script)
+ mail:
+   -account ACCOUNT
+
+Each message is logged with a campaign attribute, from -campaign, an addressee's campaign attribute,
+or the first template and addressee file names (e.g. "template1-addressees"); it is also available as $CAMPAIGN.
+Each campaign has its own log file, e.g. log.template1-addressees.xml for log.xml.
+check and remind go through the log and the campaign log files, but not archived (.gz) ones,
+so closed campaigns cost nothing.
+
+Only the chosen backend is loaded, and it imports its mail transport only when used,
+so -debug runs start quickly.
+'''
+
+import sys,os,importlib
+from . import core
+
+backends=('gmail','outlook','mail')
+
+def main(backend='gmail',argv=None):
+   if argv==None: argv=sys.argv[1:]
+   if argv[:1]==['-backend'] or argv[:1]==['-b']: backend=argv[1]; argv=argv[2:]
+   if backend not in backends: raise ValueError(f'Backend {backend} not recognized!')
+   mod=importlib.import_module('.'+backend,__package__)
+   template=''
+   addressees=[]
+   campaign=''
+   files={'template':[],'addressees':[]}
+   log='log.xml'
+   mailfolder='automail'
+   args=iter(argv)
+   for arg in args:
+      if arg=='-template' or arg=='-t':
+         files['template']+=[next(args)]
+         template+=core.readfile(files['template'][-1]) # appends
+      elif arg=='-addressees' or arg=='-a':
+         files['addressees']+=[next(args)]
+         addressees+=core.parse_xml(files['addressees'][-1])
+      elif arg=='-log' or arg=='-l': log=next(args)
+      elif arg=='-campaign': campaign=next(args)
+      elif arg=='-send' or arg=='-s':
+         name=campaign or '-'.join(os.path.splitext(os.path.basename(f[0]))[0] for f in files.values() if f)
+         mod.send(template,[dict({'campaign':name},**addressee) for addressee in addressees],log)
+      elif arg=='-archive': core.archive(log)
+      elif arg=='-close': core.archive(log,next(args))
+      elif arg=='-folder' or arg=='-f': mailfolder=next(args)
+      elif arg=='-check' or arg=='-c': mod.check(log,mailfolder)
+      elif arg=='-recheck': mod.check(log,mailfolder,all=True)
+      elif arg=='-remind' or arg=='-r': mod.remind(template,log)
+      elif arg=='-replies': core.review(log)
+      elif arg=='-store': core.replystore=next(args)
+      elif arg=='-debug' or arg=='-d': core.debug=True
+      elif arg=='-account' and backend in ('gmail','mail'): mod.acct=next(args)
+      elif backend=='gmail' and gmail_arg(mod,arg,args,log,mailfolder): pass
+      elif arg=='-html' or arg=='-h': mod.html=True
+      elif backend!='gmail' and arg=='-script':
+         from .applescript import run_applescript_file
+         run_applescript_file(next(args))
+      else: raise ValueError(f'Argument {arg} not recognized!')
+
+def gmail_arg(mod,arg,args,log,mailfolder):
+   # handles gmail-only arguments, returning False if not one
+   if arg=='-username' or arg=='-u': mod.user=next(args)
+   elif arg=='-password' or arg=='-p': mod.password=next(args)
+   elif arg=='-passvar': mod.password=os.environ.get(next(args))
+   elif arg=='-watch' or arg=='-w': mod.watch(log,mailfolder)
+   elif arg=='-imaphost': mod.imaphost=next(args)
+   elif arg=='-bcc': mod.maxbcc=int(next(args))
+   elif arg=='-connections': mod.connections=int(next(args))
+   elif arg=='-maxreply': mod.maxreply=int(next(args))
+   elif arg=='-relays': mod.relays+=mod.readrelays(next(args))
+   else: return False
+   return True
@@ -0,0 +1,248 @@
+'''
+Shared core of the automail backends: template substitution, XML lists and the message log,
+and the send/check/remind loops, which call backend functions to send a message or get replies.
+'''
+
+import re,os,datetime,copy
+import xml.etree.ElementTree as ET
+
+debug=False
+replystore='replies' # directory of stored replies
+
+def expandfile(file):
+   text=''
+   with open(file,'r') as fp:
+      for line in fp:
+         if line.startswith('++'): text+=expandfile(line[2:])
+         else: text+=line
+   return text
+
+def subwords(text,vars):
+   text1=text
+   for var in vars.keys():
+      var1=r'\$'+var.upper() # keyword is $ plus varname in uppercase
+      val=vars[var]
+      text1=re.sub(var1,val,text1)
+   text2=''
+   for line in text1.splitlines():
+      if line.startswith('++'):text2+=expandfile(line[2:])
+      else: text2+=line+'\n'
+   return text2
+
+def readfile(file):
+   with open(file,'r') as fp: return fp.read()
+
+def read_xml(filename):
+   tree = ET.parse(filename)
+   return tree.getroot()
+
+def parse_xml(filename):
+   data=[]
+   for child in read_xml(filename): data+=[child.attrib] # converts to dict
+   return data
+
+def logtime(tt=None):
+   if tt==None: tt=datetime.datetime.now()
+   return tt.strftime("%-m/%-d/%y %H:%M")
+
+def readlogdata(logfile):
+   # read log file
+   try:
+      tree = ET.parse(logfile)
+      root = tree.getroot()
+   except FileNotFoundError:
+      print(f"File '{logfile}' not found, will create.")
+      root = ET.Element("root"); root.tail='\n'
+      tree = ET.ElementTree(root)
+   except ET.ParseError: raise Exception(f"Error: File '{logfile}' could not be parsed.")
+   return(tree,root)
+
+def partition(log,campaign):
+   # log file for a campaign, e.g. log.CAMPAIGN.xml for log.xml; entries without campaign stay in log
+   if campaign=='': return log
+   (base,ext)=os.path.splitext(log)
+   campaign=re.sub(r'[^\w.-]','_',campaign)
+   return f'{base}.{campaign}{ext}'
+
+def logfiles(log):
+   # the log and its active (not archived) campaign partitions
+   import glob
+   (base,ext)=os.path.splitext(log)
+   files=sorted(file for file in glob.glob(glob.escape(base)+'.*'+ext) if not file.endswith('.gz')) # .gz: archived
+   if os.path.exists(log) or not files: files=[log]+files
+   return files
+
+def logentries(log):
+   for logfile in logfiles(log):
+      if os.path.exists(logfile): yield from readlogdata(logfile)[1]
+
+def archive(log,campaign=''):
+   # compress partitions of the named campaign, or else of campaigns with replies to all messages,
+   # so check and remind no longer scan them
+   import gzip
+   today=logtime().split()[0]
+   for logfile in logfiles(log):
+      if logfile==log: continue
+      (tree,root)=readlogdata(logfile)
+      if campaign!='': done = logfile==partition(log,campaign)
+      else: done = all(msg.get('reply')!='' for msg in root)
+      if not done: continue
+      times=[t for msg in root for t in msg.get('sent','').split(',')+msg.get('remind','').split(',')]
+      if any(t.split(' ')[0]==today for t in times): # still counted against today's relay quotas
+         print(f'Not archiving {logfile}: messages sent today')
+         continue
+      if os.path.exists(logfile+'.gz'): # archived before and then reopened: merge entries
+         with gzip.open(logfile+'.gz','rb') as fp: archived=ET.parse(fp)
+         archived.getroot().extend(list(root))
+         tree=archived
+      with gzip.open(logfile+'.gz','wb') as fp: tree.write(fp)
+      os.remove(logfile)
+      print(f'Archived {logfile} to {logfile}.gz')
+
+def logmsg(log,msg,vars={}):
+   logfile=partition(log,vars.get('campaign',''))
+   (tree,root)=readlogdata(logfile)
+
+   # create new item
+   newel = ET.Element("msg"); newel.tail='\n'
+   newel.attrib.update(vars)
+   addr=getaddress(msg)
+   subj=getsubject(msg)
+   newel.set('address',addr)
+   newel.set('subject',subj)
+   newel.set('sent',logtime())
+   newel.set('reply','')
+
+   # append and write
+   root.append(newel)
+   tree.write(logfile)   
+
+def logreply(msg):
+   msgreply=msg.get('reply')
+   if msgreply!='': msgreply+=','
+   msgreply+=logtime()
+   msg.set('reply',msgreply)
+
+def replykey(msgid='',text=''):
+   # store key: hash of Message-ID if known, else of reply content (never of '', shared by all)
+   import hashlib
+   return hashlib.sha1((msgid or text).encode()).hexdigest()
+
+def replyfile(key): return os.path.join(replystore,key+'.gz')
+
+def hasreply(key): return os.path.exists(replyfile(key))
+
+def putreply(key,text):
+   import gzip
+   os.makedirs(replystore,exist_ok=True)
+   if not hasreply(key):
+      with gzip.open(replyfile(key),'wt') as fp: fp.write(text)
+
+def getstoredreply(key):
+   import gzip
+   with gzip.open(replyfile(key),'rt') as fp: return fp.read()
+
+def logreplies(msg,replies):
+   # store (key,text) replies, print them and link them from the log entry, returning True if any.
+   # replies may be a generator, so each is printed and stored as it arrives
+   keys=[]
+   for (key,text) in replies:
+      if not keys: print('Reply:')
+      print(text)
+      putreply(key,text)
+      keys+=[key]
+   return linkreplies(msg,keys)
+
+def linkreplies(msg,keys):
+   # link stored replies from the log entry and log the reply, returning True if any
+   if not keys: return False
+   linked=[key for key in msg.get('replies','').split(',') if key]
+   msg.set('replies',','.join(linked+[key for key in keys if key not in linked]))
+   logreply(msg)
+   return True
+
+def getline(text,label):
+   for line in text.splitlines():
+      if line.startswith(label): return line[len(label):]
+   return ''
+
+def getaddress(text): return getline(text,'To: ')
+def getsubject(text): return getline(text,'Subject: ')
+
+def getattachments(text):
+   # files named on 'Attach: ' lines before the body
+   files=[]
+   for line in text.splitlines():
+      if line.startswith('Body:'): break
+      if line.startswith('Attach: '): files+=[line[len('Attach: '):].strip()]
+   return files
+
+def missingattachments(msgs):
+   # files on 'Attach: ' lines of any of the messages that can't be read, to check before sending any
+   files={file for msg in msgs for file in getattachments(msg)}
+   return sorted(file for file in files if not os.path.isfile(file))
+
+def getbody(text):
+   body=''
+   bodymode=False
+   for line in text.splitlines():
+      if bodymode: body+=line+'\n'
+      elif line.startswith('Body:'): bodymode=True
+   return body
+
+def send(template,addressees,log,sendmsg):
+   # sendmsg(msg) sends one message, returning True if sent (in debug mode, just prints)
+   msgs=[(subwords(template,addressee),addressee) for addressee in addressees]
+   missing=missingattachments(msg for (msg,_) in msgs)
+   if missing:
+      print('Error: attachments not found, not sending: '+', '.join(missing))
+      return
+   for (msg,addressee) in msgs:
+      if debug: print('Message:\n',msg)
+      if sendmsg(msg) and not debug: logmsg(log,msg,addressee)
+
+def check(log,savefolder,getreply,all=False):
+   # getreply(logitem,savefolder) returns list or generator of (key,text) of new replies to a logged message;
+   # replies already stored are read from disk, not fetched again
+   for logfile in logfiles(log): checkfile(logfile,savefolder,getreply,all)
+
+def checkfile(log,savefolder,getreply,all=False):
+   (tree,root)=readlogdata(log)
+   change=False
+   for msg in root:
+      if all or msg.get('reply')=='':
+         if all: showreplies(msg)
+         if logreplies(msg,getreply(msg,savefolder)): change=True
+   if change: tree.write(log)
+
+def showreplies(msg):
+   for key in msg.get('replies','').split(','):
+      if key and hasreply(key): print('Stored reply:'); print(getstoredreply(key))
+
+def review(log):
+   # print stored replies for all logged messages
+   for msg in logentries(log):
+      if msg.get('replies',''):
+         print(f"To: {msg.get('address')}\nSubject: {msg.get('subject')}\nReplied: {msg.get('reply')}")
+         showreplies(msg)
+
+def remind(template,log,sendmsg):
+   # sendmsg(msg,logitem) sends a reminder for a logged message, returning True if sent
+   for logfile in logfiles(log): remindfile(template,logfile,sendmsg)
+
+def remindfile(template,log,sendmsg):
+   (tree,root)=readlogdata(log)
+   change=False
+   for logitem in root:
+      if logitem.attrib['reply']=='':
+         vars=copy.deepcopy(logitem.attrib)
+         vars['subject']='Re: '+vars['subject']
+         msg=subwords(template,vars)
+         if debug: print('Message:\n',msg)
+         if sendmsg(msg,logitem) and not debug:
+            remind=''
+            if 'remind' in logitem.attrib: remind=logitem.attrib['remind']+','
+            remind+=logtime()
+            logitem.set('remind',remind)
+            change=True
+   if change: tree.write(log)
@@ -0,0 +1,481 @@
+'''
+Gmail backend: sends via SMTP and checks replies via IMAP, accessed by app password, not OAuth API.
+smtplib, imaplib and the email package are only imported when a message is actually sent or fetched.
+
+Options (set by the command line):
+   user, acct, password: gmail account; relays: relay pool (see below); maxbcc: recipients per message;
+   connections: IMAP connections per relay used by check; html: also send an HTML alternative of the body;
+   maxreply: characters of reply text kept (at most 4*maxreply+64k bytes of each reply are fetched);
+   imaphost: HOST[:PORT] (ports other than 993 are unencrypted, e.g. local test server)
+
+A relay pool spreads sending over several accounts, e.g. to stay under each account's daily send cap.
+Each entry of the relay XML file defines one account by its attributes:
+   name (default: account), account, password or passvar, username, quota (messages per day, default unlimited),
+   address (default: ACCOUNT@gmail.com), smtphost (default: smtp.gmail.com:587), imaphost (default: -imaphost)
+e.g. <relay name="r1" account="myacct" passvar="R1PASS" username="My Name" quota="400" />
+Messages are sent through the relay with most quota left, except that an addressee already in the log
+keeps the same relay. The relay is recorded in the log, and used for reminders and for checking replies.
+With a relay pool, the command-line account neither sends nor is watched; it is used only to check
+and remind log entries recorded without a relay.
+'''
+
+import sys,os,re,time,threading,functools
+from . import core
+
+user=acct=password=''
+imaphost='imap.gmail.com'
+relays=[]
+maxbcc=1
+connections=1
+html=False
+maxreply=1000000
+loglock=threading.Lock()
+
+def readrelays(filename):
+   relays=core.parse_xml(filename)
+   for relay in relays:
+      if 'name' not in relay: relay['name']=relay['account']
+      if 'passvar' in relay: relay['password']=os.environ.get(relay['passvar'])
+   return relays
+
+def getrelay(name=''):
+   # relay from pool by name, None if not in pool; '' is the account given on the command line
+   global relays,user,acct,password,imaphost
+   for relay in relays:
+      if relay['name']==name: return relay
+   if name!='': return None
+   return {'name':'','username':user,'account':acct,'password':password,'imaphost':imaphost}
+
+def relaypool():
+   # accounts used to send and watched: the relay pool, else the command-line account
+   global relays
+   return relays or [getrelay()]
+
+def relayusage(logentries):
+   # count messages sent and reminders sent today through each relay, from log
+   today=core.logtime().split()[0]
+   used={}
+   for logitem in logentries:
+      name=logitem.get('relay','')
+      times=logitem.get('sent','').split(',')+logitem.get('remind','').split(',')
+      used[name]=used.get(name,0)+sum(1 for t in times if t.split(' ')[0]==today)
+   return used
+
+def pickrelay(used,name=None):
+   # sticky relay if name given, otherwise the relay with most quota left; None if over quota
+   candidates=[relay for relay in [getrelay(name)] if relay] if name!=None else relaypool()
+   best=None; bestleft=0
+   for relay in candidates:
+      quota=int(relay.get('quota',0)) # 0: unlimited
+      left=quota-used.get(relay['name'],0) if quota else float('inf')
+      if left>bestleft: best=relay; bestleft=left
+   return best
+
+@functools.lru_cache(maxsize=16)
+def attachment(file):
+   # MIME part for a file, read, base64-encoded and serialized once and shared by all messages attaching it
+   import mimetypes
+   from email.mime.base import MIMEBase
+   from email import encoders,policy
+   ctype, encoding = mimetypes.guess_type(file)
+   if ctype is None or encoding is not None: ctype = 'application/octet-stream'
+   maintype, subtype = ctype.split('/', 1)
+   part = MIMEBase(maintype, subtype)
+   with open(file,'rb') as fp: part.set_payload(fp.read())
+   encoders.encode_base64(part)
+   part.add_header('Content-Disposition', 'attachment', filename=os.path.basename(file))
+   return part.as_bytes(policy=policy.compat32.clone(linesep='\r\n'))
+
+@functools.lru_cache(maxsize=16)
+def skeleton(sender,files,html):
+   # the fixed parts of a message, prepared once per sender and attachment list:
+   # (headers before To, boundary, alternative boundary, closing bytes with attachments)
+   import random
+   boundary,altboundary=['='*15+str(random.randrange(sys.maxsize))+'==' for i in range(2)]
+   head=f'Content-Type: multipart/mixed; boundary="{boundary}"\r\nMIME-Version: 1.0\r\nFrom: {sender}\r\n'.encode()
+   tail=b''.join(f'--{boundary}\r\n'.encode()+attachment(file)+b'\r\n' for file in files)+f'--{boundary}--\r\n'.encode()
+   return (head,boundary,altboundary,tail)
+
+def textpart(body,subtype,boundary):
+   # 7bit if possible, else base64 (which also can't contain a boundary line)
+   if body.isascii() and '--'+boundary not in body:
+      return f'Content-Type: text/{subtype}; charset="us-ascii"\r\nMIME-Version: 1.0\r\nContent-Transfer-Encoding: 7bit\r\n\r\n'.encode()+body.replace('\n','\r\n').encode()
+   import base64
+   return f'Content-Type: text/{subtype}; charset="utf-8"\r\nMIME-Version: 1.0\r\nContent-Transfer-Encoding: base64\r\n\r\n'.encode()+base64.encodebytes(body.encode()).replace(b'\n',b'\r\n')
+
+def buildmsg(sender,addr,subj,body,files=(),html=False):
+   # message as bytes ready for SMTP, the same layout as MIMEMultipart().as_string() gave,
+   # with only To, Subject and body built per message
+   (head,boundary,altboundary,tail)=skeleton(sender,tuple(files),html)
+   from email.header import Header
+   subj=Header(subj,'us-ascii' if subj.isascii() else 'utf-8',header_name='Subject').encode(linesep='\r\n') # long subjects folded, with CRLF like the rest
+   parts=[head,f'To: {addr}\r\nSubject: {subj}\r\n\r\n--{boundary}\r\n'.encode()]
+   if html: # plain and HTML alternatives, HTML as in the Outlook backend
+      parts+=[f'Content-Type: multipart/alternative; boundary="{altboundary}"\r\nMIME-Version: 1.0\r\n\r\n--{altboundary}\r\n'.encode(),
+              textpart(body,'plain',altboundary),f'\r\n--{altboundary}\r\n'.encode(),
+              textpart('<body>'+body.replace('\n','<br>\n')+'</body>','html',altboundary),f'\r\n--{altboundary}--\r\n'.encode()]
+   else: parts+=[textpart(body,'plain',boundary),b'\r\n']
+   return b''.join(parts+[tail])
+
+def send_gmail(msg,relay,bcc=[]):
+   # if bcc is given, one message is sent to all its addresses, instead of to the To: address
+   global html
+   import smtplib
+   from email.utils import formataddr
+   addr=core.getaddress(msg)
+   subj=core.getsubject(msg)
+   body=core.getbody(msg)
+
+   acct=relay['account']
+   fromaddr=relay.get('address',acct+'@gmail.com')
+   sender=formataddr((relay.get('username',''),fromaddr))
+
+   try:
+      gmsg=buildmsg(sender,addr if not bcc else 'undisclosed-recipients:;',subj,body,core.getattachments(msg),html)
+      host,_,port=relay.get('smtphost','smtp.gmail.com:587').partition(':')
+      server = smtplib.SMTP(host, int(port or 587))
+      server.starttls()
+      server.login(acct,relay['password'])
+      server.sendmail(fromaddr, bcc or addr, gmsg)
+      server.quit()
+      return True
+   except Exception as e:
+      print("Error: ", e)
+      return False
+
+def send(template,addressees,log):
+   global maxbcc
+   used=relayusage(core.logentries(log))
+   sticky={logitem.get('address'):logitem.get('relay') for logitem in core.logentries(log) if logitem.get('relay')}
+
+   msgs=[(core.subwords(template,addressee),addressee) for addressee in addressees]
+   missing=core.missingattachments(msg for (msg,_) in msgs)
+   if missing: # before sending any, also in debug mode
+      print('Error: attachments not found, not sending: '+', '.join(missing))
+      return
+
+   # group messages with identical subject, body and attachments through the same relay, to send as one
+   groups={}
+   for (msg,addressee) in msgs:
+      relay=None
+      if core.getaddress(msg) in sticky: relay=pickrelay(used,sticky[core.getaddress(msg)])
+      if relay==None: relay=pickrelay(used)
+      if relay==None:
+         print('Error: all relays are over quota for today, stopping.')
+         break
+      used[relay['name']]=used.get(relay['name'],0)+1
+      key=(relay['name'],core.getsubject(msg),core.getbody(msg),tuple(core.getattachments(msg))) if maxbcc>1 else len(groups)
+      groups.setdefault(key,[]).append((msg,addressee,relay))
+
+   for group in groups.values():
+      for i in range(0,len(group),maxbcc):
+         batch=group[i:i+maxbcc]
+         (msg,addressee,relay)=batch[0]
+         bcc=[core.getaddress(msg1) for (msg1,_,_) in batch] if len(batch)>1 else []
+         if core.debug:
+            print(f'Relay: {relay["name"]}')
+            if bcc: print('Bcc: '+', '.join(bcc))
+            print(msg)
+         elif send_gmail(msg,relay,bcc):
+            for (msg1,addressee1,_) in batch: # log each recipient separately
+               vars=dict(addressee1)
+               if relay['name']!='': vars['relay']=relay['name']
+               core.logmsg(log,msg1,vars)
+
+def imap_connect(relay):
+   global imaphost
+   import imaplib
+   host,_,port=relay.get('imaphost',imaphost).partition(':')
+   port=int(port) if port else 993
+   if port==993: imap = imaplib.IMAP4_SSL(host,port)
+   else: imap = imaplib.IMAP4(host,port) # unencrypted, e.g. local test server
+   imap.login(relay['account'], relay['password'])
+   return imap
+
+def imap_makefolder(imap,savefolder):
+   # create savefolder if necessary
+   status, folders = imap.list()
+   if status == 'OK':
+      folder_exists = any(f'"{savefolder}"' in folder.decode() for folder in folders)
+   
+      if not folder_exists:
+         # Folder doesn't exist, so create it
+         print(f"Creating folder: {savefolder}")
+         imap.create(savefolder)
+
+def imap_search(imap,addr,subj,uidrange=''):
+   # returns UIDs (stable across expunges, unlike message sequence numbers)
+   crit=f'FROM "{addr}" SUBJECT "{subj}"'
+   if uidrange: crit=f'UID {uidrange} '+crit
+   status, messages = imap.uid('search', None, f'({crit})')
+   return messages[0].split() # convert result to list of email UIDs
+
+def imap_messageid(imap,mail):
+   # just the Message-ID header, to avoid downloading replies already stored
+   _, data = imap.uid('fetch', mail, '(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])')
+   for response in data:
+      if isinstance(response, tuple):
+         header = re.search(rb'^message-id:\s*(.*?)\s*$', response[1], re.I|re.M)
+         if header: return header.group(1).decode(errors='replace')
+   return ''
+
+def imap_unstored(imap,mails):
+   # (mail,msgid) of replies whose Message-ID is not in the reply store.
+   # Replies without a Message-ID can only be keyed by content, so they are always fetched.
+   for mail in mails:
+      msgid=imap_messageid(imap,mail)
+      if not (msgid and core.hasreply(core.replykey(msgid))): yield (mail,msgid)
+
+def newreplykey(msgid,text):
+   # store key of a fetched reply, None if already stored (e.g. same content, without Message-ID)
+   key=core.replykey(msgid,text)
+   return None if core.hasreply(key) else key
+
+def imap_getreplies(imap,mails,addr,subj,savefolder):
+   # generates (key,text) of replies not already in the reply store, one at a time
+   for (mail,msgid) in imap_unstored(imap,mails):
+      (raw,truncated)=imap_fetch(imap,mail,savefolder)
+      try: text=parsereply(raw,addr,subj,truncated)
+      except Exception as e: # one bad reply doesn't stop the others being logged
+         print(f'Error parsing reply from {addr}: {e}')
+         continue
+      key=newreplykey(msgid,text)
+      if key: yield (key,text)
+
+def imap_fetch(imap,mail,savefolder):
+   # raw content of a reply, up to the size cap, in one partial fetch; returns (raw,truncated).
+   # The reply is then moved to the save folder.
+   global maxreply
+   rawcap=4*maxreply+65536 # room for headers, encoding and other parts
+   _, msg = imap.uid('fetch', mail, f'(BODY[]<0.{rawcap+1}>)') # one byte more shows if cut off
+   raw=b''.join(response[1] for response in msg if isinstance(response, tuple))
+
+   # move to save folder (label)
+   imap.uid('store', mail, '+X-GM-LABELS', savefolder)
+   imap.uid('store', mail, '+FLAGS', '\\Deleted')
+   imap.expunge()
+   return (raw[:rawcap],len(raw)>rawcap)
+
+def parsereply(raw,addr,subj,truncated=False):
+   # text of a reply; text over the size cap is dropped, leaving a marker
+   global maxreply
+   import email,codecs
+   msg=email.message_from_bytes(raw) # parse raw content
+   del raw
+   reply=[f'From: {addr}\nSubject: {subj}\n']
+   size=0
+
+   # extract body
+   for part in msg.walk() if msg.is_multipart() else [msg]:
+      if part.is_multipart() or (msg.is_multipart() and part.get_content_type()!="text/plain"): continue
+      left=maxreply-size
+      payload=part.get_payload(decode=True) or b''
+      charset=part.get_content_charset() or 'utf-8'
+      try: codecs.lookup(charset)
+      except LookupError: charset='utf-8' # e.g. unknown-8bit
+      body=payload[:4*left].decode(charset,errors='replace') # at most 4 bytes a character
+      if len(body)>left or len(payload)>4*left:
+         body=body[:left]+f'\n[... reply truncated at {maxreply} characters ...]'
+         truncated=False # marked
+      reply+=[f'Body:\n{body}\n']
+      size+=len(body)
+      if size>=maxreply: break
+   if truncated: reply+=[f'[... reply truncated at {4*maxreply+65536} bytes ...]\n']
+   return ''.join(reply)
+
+def gmail_getreply(addr,subj,savefolder,relay):
+   # generates replies as they are fetched, rather than collecting them all first
+   imap=imap_connect(relay)
+   try:
+      imap_makefolder(imap,savefolder)
+      imap.select("inbox")
+
+      yield from imap_getreplies(imap,imap_search(imap,addr,subj),addr,subj,savefolder)
+
+      imap.close()
+   finally: imap.logout()
+
+def getreply(logitem,savefolder):
+   relay=getrelay(logitem.get('relay',''))
+   if relay==None: # e.g. run without -relays, or relay removed from the pool
+      print(f'Warning: relay {logitem.get("relay")} not in relay pool, skipping {logitem.get("address")}')
+      return []
+   return gmail_getreply(logitem.attrib['address'],logitem.attrib['subject'],savefolder,relay)
+
+def check(log,savefolder,all=False):
+   global connections
+   if connections>1: check_parallel(log,savefolder,all,connections)
+   else: core.check(log,savefolder,getreply,all)
+
+def check_share(relay,msgs,savefolder,parser):
+   # searches and fetches replies for a share of the log entries over one IMAP connection.
+   # Parsing and storing is handed to the parser pool, so the connection keeps fetching.
+   results=[]
+   try:
+      imap=imap_connect(relay)
+      imap.select("inbox")
+      for msg in msgs:
+         addr=msg.attrib['address']
+         subj=msg.attrib['subject']
+         replies=[]
+         results+=[(msg,replies)] # before fetching, so replies already moved are logged if the connection fails
+         for (mail,msgid) in imap_unstored(imap,imap_search(imap,addr,subj)):
+            (raw,truncated)=imap_fetch(imap,mail,savefolder)
+            replies+=[parser.submit(storereply,msgid,raw,addr,subj,truncated)]
+      imap.close()
+      imap.logout()
+   except Exception as e: print(f'Error checking replies to {relay["account"]}: {e}')
+   return results # as far as got
+
+def storereply(msgid,raw,addr,subj,truncated):
+   # parser pool task: parse a fetched reply and store it at once, so it is kept even if the check
+   # doesn't finish; returns its key, None if already stored
+   text=parsereply(raw,addr,subj,truncated)
+   key=newreplykey(msgid,text)
+   if key:
+      core.putreply(key,text)
+      print(f'Reply:\n{text}')
+   return key
+
+def storedkeys(msg,replies):
+   # keys of stored replies, leaving out any that failed to parse
+   keys=[]
+   for reply in replies:
+      try: key=reply.result()
+      except Exception as e:
+         print(f'Error parsing reply from {msg.get("address")}: {e}')
+         continue
+      if key: keys+=[key]
+   return keys
+
+def check_parallel(log,savefolder,all,connections):
+   # pending entries of all active log partitions, split across several IMAP connections per relay;
+   # each partition written once at the end
+   from concurrent.futures import ThreadPoolExecutor
+   trees={}
+   logfile={} # partition of each entry
+   byrelay={}
+   for file in core.logfiles(log):
+      (trees[file],root)=core.readlogdata(file)
+      for msg in root:
+         if all or msg.get('reply')=='':
+            if all: core.showreplies(msg)
+            logfile[msg]=file
+            byrelay.setdefault(msg.get('relay',''),[]).append(msg)
+   shares=[]
+   for (name,msgs) in byrelay.items():
+      relay=getrelay(name)
+      if relay==None:
+         print(f'Warning: relay {name} not in relay pool, skipping {len(msgs)} log entries')
+         continue
+      imap=imap_connect(relay) # create save folder once, before the workers use it
+      imap_makefolder(imap,savefolder)
+      imap.logout()
+      n=min(connections,len(msgs))
+      shares+=[(relay,msgs[i::n]) for i in range(n)]
+
+   with ThreadPoolExecutor(max_workers=1) as parser:
+      with ThreadPoolExecutor(max_workers=max(1,len(shares))) as pool:
+         futures=[pool.submit(check_share,relay,msgs,savefolder,parser) for (relay,msgs) in shares]
+         results=[result for future in futures for result in future.result()]
+      changed=set()
+      for (msg,replies) in results:
+         if core.linkreplies(msg,storedkeys(msg,replies)): changed.add(logfile[msg])
+   for file in changed: trees[file].write(file)
+
+def imap_uidnext(imap,folder='inbox'):
+   _, data = imap.status(folder, '(UIDNEXT)')
+   return int(re.search(rb'UIDNEXT (\d+)', data[0]).group(1))
+
+def imap_idle(imap,timeout):
+   # IMAP IDLE (RFC 2177): block until the server pushes an update or timeout expires.
+   # Waits in readline, not select on the socket, as an update may already be in imaplib's read buffer.
+   import imaplib,socket
+   if 'IDLE' not in imap.capabilities:
+      time.sleep(timeout)
+      imap.noop()
+      return
+   tag = imap._new_tag()
+   imap.send(tag+b' IDLE\r\n')
+   line = imap.readline()
+   if not line.startswith(b'+'): raise imaplib.IMAP4.error(f'IDLE refused: {line}')
+   imap.sock.settimeout(timeout)
+   try: line = imap.readline()
+   except socket.timeout:
+      line = b''
+      imap.file = imap.sock.makefile('rb') # a file object can't be read after a timeout
+   finally: imap.sock.settimeout(None)
+   if line.startswith(tag): return # server ended IDLE itself
+   if line.startswith(b'* BYE'): raise imaplib.IMAP4.abort(f'server closed connection: {line}')
+   imap.send(b'DONE\r\n')
+   while True: # untagged updates, then tagged completion
+      line = imap.readline()
+      if not line: raise imaplib.IMAP4.abort('connection closed during IDLE')
+      if line.startswith(tag): break
+
+def watch_new(imap,log,savefolder,uidnext,relay):
+   # check replies against pending log entries sent via relay, for messages with UID >= uidnext
+   global loglock
+   _, data = imap.uid('search', None, f'UID {uidnext}:*')
+   uids = [int(uid) for uid in data[0].split() if int(uid)>=uidnext] # n:* always includes last message
+   if not uids: return uidnext
+   with loglock: # one watcher thread per relay
+      for logfile in core.logfiles(log): watch_log(imap,logfile,savefolder,uidnext,relay)
+   return max(uids)+1
+
+def watch_log(imap,log,savefolder,uidnext,relay):
+   (tree,root)=core.readlogdata(log) # re-read, may have been updated by send
+   change=False
+   for msg in root:
+      if msg.get('reply')=='' and msg.get('relay','')==relay['name']:
+         addr=msg.attrib['address']
+         subj=msg.attrib['subject']
+         mails=[mail for mail in imap_search(imap,addr,subj,f'{uidnext}:*') if int(mail)>=uidnext]
+         if core.logreplies(msg,imap_getreplies(imap,mails,addr,subj,savefolder)): change=True
+   if change: tree.write(log)
+
+def watch(log,savefolder,timeout=25*60):
+   # long-running: IDLE on the inbox of each relay and process replies as they arrive.
+   # Only messages arriving after startup are checked; use -check first for older ones.
+   threads=[threading.Thread(target=watch_relay,args=(log,savefolder,relay,timeout),daemon=True) for relay in relaypool()]
+   for thread in threads: thread.start()
+   for thread in threads: thread.join()
+
+def watch_relay(log,savefolder,relay,timeout):
+   # timeout re-issues IDLE before servers drop it (RFC 2177 suggests under 29 min)
+   import imaplib
+   uidnext=None
+   delay=10
+   while True:
+      try:
+         imap=imap_connect(relay)
+         imap_makefolder(imap,savefolder)
+         imap.select("inbox")
+         if uidnext==None: uidnext=imap_uidnext(imap)
+         print(f'Watching for replies to {relay["account"]} (UID {uidnext} on)')
+         delay=10
+         while True:
+            uidnext=watch_new(imap,log,savefolder,uidnext,relay)
+            imap_idle(imap,timeout)
+      except (imaplib.IMAP4.error,OSError) as e: # IMAP4.error includes abort, and NO/BAD replies
+         print(f'Connection lost ({e}), reconnecting in {delay} s')
+         time.sleep(delay)
+         delay=min(2*delay,600) # back off while the server keeps failing
+
+def remind(template,log):
+   used=relayusage(core.logentries(log))
+   def sendmsg(msg,logitem):
+      if getrelay(logitem.get('relay',''))==None:
+         print(f'Warning: relay {logitem.get("relay")} not in relay pool, skipping reminder to {logitem.get("address")}')
+         return False
+      relay=pickrelay(used,logitem.get('relay','')) # same relay as original
+      if relay==None:
+         print(f'Relay {logitem.get("relay")} over quota, skipping reminder to {logitem.get("address")}')
+         return False
+      if core.debug:
+         print(f'Relay: {relay["name"]}')
+         return False
+      if not send_gmail(msg,relay): return False
+      used[relay['name']]=used.get(relay['name'],0)+1
+      return True
+   core.remind(template,log,sendmsg)
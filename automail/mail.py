@@ -0,0 +1,77 @@
+'''
+Mac Mail backend, controlling Mail using AppleScript (not tested).
+
+Options (set by the command line):
+   html: format email body as HTML
+   acct: Mail account holding the folder for replies
+'''
+
+import os
+from . import core
+from .applescript import run_applescript_str,applescript_date,getreply as run_getreply
+
+html=False
+acct=''
+
+def applescript_email(msg):
+   global html
+   addr=core.getaddress(msg)
+   subj=core.getsubject(msg)
+   body=core.getbody(msg)
+   if html: body='<body>'+body.replace('\n','<br>\n')+'</body>'
+   attachments=''.join(f'        make new attachment with properties {{file name:POSIX file "{os.path.abspath(file)}"}} at after the last paragraph of content\n' for file in core.getattachments(msg))
+   script = f'''
+tell application "Mail"
+    set newMessage to make new outgoing message with properties {{subject:"{subj}", content:"{body}", visible:true}}
+    tell newMessage
+        set visible to true
+        make new to recipient at end of to recipients with properties {{address:"{addr}"}}
+{attachments}        send
+    end tell
+end tell
+'''
+   return script
+
+def applescript_getreply(addr,subj,savefolder,sent=''):
+   global acct
+   applescript = f'''
+tell application "Mail"
+    set theSubject to "{subj}"
+    set theSender to "{addr}"
+    set theInbox to inbox
+    set theFolderName to "{savefolder}"
+    set theAccount to "{acct}"
+
+    -- Check if the folder exists, if not, create it
+    try
+        set theFolder to mailbox theFolderName of account theAccount
+    on error
+        set theFolder to make new mailbox with properties {{name:theFolderName}} at account theAccount
+    end try
+
+    -- Filtered by Mail, so only matching messages received since sending are fetched
+    {applescript_date('sentDate',sent)}
+    set output to ""
+    set theMessages to (messages of theInbox whose sender contains theSender and subject contains theSubject and date received > sentDate)
+    repeat with aMessage in theMessages
+        -- Append the content of the message to the output
+        set output to output & "From: " & theSender & return & "Subject: " & subject of aMessage & return & content of aMessage & "\n\n"
+        -- Move the message to the specified folder
+        move aMessage to theFolder
+    end repeat
+
+    return output
+end tell
+'''
+   return applescript
+
+def sendmsg(msg,logitem=None):
+   run_applescript_str(applescript_email(msg))
+   return True
+
+def getreply(logitem,savefolder):
+   return run_getreply(applescript_getreply(logitem.attrib['address'],logitem.attrib['subject'],savefolder,logitem.get('sent','')))
+
+def send(template,addressees,log): core.send(template,addressees,log,sendmsg)
+def check(log,savefolder,all=False): core.check(log,savefolder,getreply,all)
+def remind(template,log): core.remind(template,log,sendmsg)
@@ -0,0 +1,84 @@
+'''
+MS Outlook backend, controlling Outlook on Mac OSX using AppleScript.
+
+Options (set by the command line):
+   html: format email body as HTML, which seems necessary to preserve line breaks with Outlook
+
+If generating HTML mails, the replies are usually HTML by default.
+When checking replies, the output can be piped through the html2text.py script to remove the HTML formatting code.
+'''
+
+import os
+from . import core
+from .applescript import run_applescript_str,applescript_date,getreply as run_getreply
+
+html=False
+
+def applescript_email(msg):
+   global html
+   addr=core.getaddress(msg)
+   subj=core.getsubject(msg)
+   body=core.getbody(msg)
+   if html: body='<body>'+body.replace('\n','<br>\n')+'</body>'
+   attachments=''.join(f'        make new attachment at newMessage with properties {{file:POSIX file "{os.path.abspath(file)}"}}\n' for file in core.getattachments(msg))
+   script = f'''
+tell application "Microsoft Outlook"
+    set newMessage to make new outgoing message with properties {{subject:"{subj}", content:"{body}"}}
+    tell newMessage
+        make new recipient at newMessage with properties {{email address:{{address:"{addr}"}}}}
+{attachments}        send
+    end tell
+end tell
+'''
+   return script
+
+def applescript_getreply(addr,subj,savefolder,sent=''):
+    applescript = f'''
+tell application "Microsoft Outlook"
+    set output to ""
+    set targetFolder to missing value
+
+    -- Check if the folder exists, if not, create it
+    repeat with aFolder in mail folders
+        if name of aFolder is "{savefolder}" then
+            set targetFolder to aFolder
+            exit repeat
+        end if
+    end repeat
+    if targetFolder is missing value then
+        set targetFolder to make new mail folder at end of mail folders with properties {{name: "{savefolder}"}}
+    end if
+
+    -- Search for matching messages, filtered by Outlook so only candidates received since sending are fetched
+    {applescript_date('sentDate',sent)}
+    set theMessages to (messages of inbox whose subject contains "{subj}" and time received > sentDate)
+    repeat with aMessage in theMessages
+        try
+            set senderObj to sender of aMessage
+            set senderAddress to address of senderObj as string
+            set senderName to name of senderObj
+            set subjectLine to subject of aMessage
+            if senderAddress is "{addr}" then
+                set output to "Subject: " & subjectLine & return & "From: " & senderName & return & "Content: " & content of aMessage
+                move aMessage to targetFolder
+                exit repeat
+            end if
+            on error errMsg number errNum
+                set output to output & "Error processing a message: " & errMsg & ", Error Number: " & errNum & return
+        end try
+    end repeat
+    return output
+end tell
+'''
+    return applescript
+
+def sendmsg(msg,logitem=None):
+   run_applescript_str(applescript_email(msg))
+   return True
+
+def getreply(logitem,savefolder):
+   return run_getreply(applescript_getreply(logitem.attrib['address'],logitem.attrib['subject'],savefolder,logitem.get('sent','')))
+
+def send(template,addressees,log): core.send(template,addressees,log,sendmsg)
+def check(log,savefolder,all=False): core.check(log,savefolder,getreply,all)
+def remind(template,log): core.remind(template,log,sendmsg)
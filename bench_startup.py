@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+'''
+Startup-time benchmark: times a -debug send of a one-addressee template for each backend,
+as a cron or debug run would start, and lists the mail transport modules that got imported
+(there should be none, since nothing is actually sent).
+
+Arguments:
+   -n RUNS (default: 20)
+'''
+
+import sys,os,subprocess,tempfile,time
+
+heavy=['smtplib','imaplib','email','subprocess']
+
+probe='''
+import sys
+from automail.cli import main
+main(sys.argv[1],sys.argv[2:])
+print('LOADED', ' '.join(m for m in %r if m in sys.modules), file=sys.stderr)
+''' % heavy
+
+# for comparison: interpreter alone, and with the transport imports the scripts used to do up front
+eager='import smtplib,imaplib,email\nfrom email.mime.text import MIMEText\nfrom email.mime.multipart import MIMEMultipart'
+
+def bench(backend,args,runs,code=probe):
+   times=[]
+   for i in range(runs):
+      t0=time.perf_counter()
+      result=subprocess.run([sys.executable,'-c',code,backend]+args, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+      times+=[time.perf_counter()-t0]
+   loaded=[line[7:] for line in result.stderr.splitlines() if line.startswith('LOADED')]
+   return (min(times),sum(times)/runs,loaded[0] if loaded else result.stderr)
+
+if __name__=='__main__':
+   runs=20
+   args=iter(sys.argv[1:])
+   for arg in args:
+      if arg=='-n': runs=int(next(args))
+      else: raise ValueError(f'Argument {arg} not recognized!')
+   with tempfile.TemporaryDirectory() as tmp:
+      template=os.path.join(tmp,'template.txt'); addressees=os.path.join(tmp,'addressees.xml')
+      with open(template,'w') as fp: fp.write('To: $EMAIL\nSubject: Test $NAME\nBody:\nHello $NAME\n')
+      with open(addressees,'w') as fp: fp.write('<mail>\n<rcpt name="A" email="a@example.com" />\n</mail>\n')
+      args=['-debug','-t',template,'-a',addressees,'-l',os.path.join(tmp,'log.xml'),'-send']
+      print(f'{"run":12}{"min ms":>10}{"mean ms":>10}  transports loaded')
+      for (name,code) in [('python','pass'),('eager',eager)]:
+         (tmin,tmean,_)=bench('',[],runs,code)
+         print(f'{name:12}{tmin*1000:10.1f}{tmean*1000:10.1f}')
+      for backend in ['gmail','outlook','mail']:
+         (tmin,tmean,loaded)=bench(backend,args,runs)
+         print(f'{backend:12}{tmin*1000:10.1f}{tmean*1000:10.1f}  {loaded or "-"}')